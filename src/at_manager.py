@@ -1,9 +1,13 @@
+import os
 import re
+import mmap
+import stat
 import time
+import tempfile
 import logging
 
 from .serial_manager import SerialManager
-from .utils import wait_for
+from .utils import wait_for, XorChecksum
 from .constants import TCPIP_ERROR_CODES
 
 logger = logging.getLogger("pyatcmd.at_manager")
@@ -11,9 +15,9 @@ logger = logging.getLogger("pyatcmd.at_manager")
 
 class AT(SerialManager):
 
-    def __init__(self):
+    def __init__(self, port_name=None):
         SerialManager.__init__(self)
-        self.port_name = None
+        self.port_name = port_name
 
     def __enter__(self):
         self.open_port()
@@ -23,10 +27,10 @@ class AT(SerialManager):
         self.close_port()
         logger.debug("AT Port closed")
 
-    def open_port(self):
+    def open_port(self, timeout=1):
         if self.port_name is None:
             self.port_name = self.get_at_port_name()
-        self.port = self.open_serial_port(self.port_name, timeout=1)
+        self.port = self.open_serial_port(self.port_name, timeout=timeout)
 
     def close_port(self):
         self.close_serial_port(self.port)
@@ -395,5 +399,143 @@ class AT(SerialManager):
         self.send_cmd('AT+CSQ')
         self.send_cmd('AT+QENG="servingcell"')
 
+    def get_file_size(self, filename):
+        resp = self.send_cmd(f"AT+QFLST=\"{filename}\"")
+        for line in resp:
+            if re.search(r"\+QFLST: \"[^\"]*\",(\d+)", line):
+                return int(re.search(r"\+QFLST: \"[^\"]*\",(\d+)", line).group(1))
+        return None
+
+    def upload_file(self, src, filename, timeout=60, flow_control=None, chunk_size=4096):
+        # src is a path (memory-mapped) or a binary file object (read from its
+        # current position). flow_control: None, "hardware" (RTS/CTS) or
+        # "software" (QFUPL ack mode, module replies 'A' every 1024 bytes).
+        # XON/XOFF is not used as it would corrupt binary data.
+        if flow_control not in (None, "hardware", "software"):
+            raise ValueError(f"Unsupported upload flow control: {flow_control}")
+        if isinstance(src, (str, os.PathLike)):
+            with open(src, "rb") as fp:
+                if os.fstat(fp.fileno()).st_size == 0:
+                    return self.upload_file(fp, filename, timeout, flow_control, chunk_size)
+                with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return self.upload_file(mm, filename, timeout, flow_control, chunk_size)
+
+        position = src.tell()
+        src.seek(0, os.SEEK_END)
+        size = src.tell() - position
+        src.seek(position)
+
+        ack_mode = flow_control == "software"
+        if ack_mode:
+            chunk_size = 1024
+        resp = self.send_cmd(
+            f"AT+QFUPL=\"{filename}\",{size},{timeout},{int(ack_mode)}", timeout=10, wait_resp="CONNECT")
+        if not any(re.search("CONNECT", line) for line in resp):
+            raise Exception(f"Unable to upload {filename}: {resp}")
+
+        checksum = XorChecksum()
+        sent = 0
+        rtscts = self.port.rtscts
+        start_time = time.time()
+        try:
+            self.port.rtscts = flow_control == "hardware"
+            while sent < size:
+                chunk = src.read(min(chunk_size, size - sent))
+                if not chunk:
+                    raise Exception(f"Unable to upload {filename}: source ended after {sent} bytes")
+                self.write_serial_port_raw(self.port, chunk)
+                checksum.update(chunk)
+                sent += len(chunk)
+                if ack_mode and len(chunk) == chunk_size and sent < size:
+                    ack = self.read_serial_port_raw(self.port, 1, timeout=timeout)
+                    if ack != b"A":
+                        raise Exception(f"Unable to upload {filename}: no ack after {sent} bytes")
+        finally:
+            self.port.rtscts = rtscts
+
+        resp = self.wait_for_response(self.port, r"\+QFUPL: \d+,[0-9a-fA-F]+", timeout=timeout)
+        return self.check_transfer(resp, "QFUPL", filename, size, checksum.digest(), start_time)
+
+    def download_file(self, filename, dst, timeout=60, flow_control=None, chunk_size=4096):
+        # dst is a path or a binary file object. Data is written as it is read
+        # from the port. flow_control: None or "hardware" (RTS/CTS).
+        # A path is only replaced once the transfer has been verified.
+        if flow_control not in (None, "hardware"):
+            raise ValueError(f"Unsupported download flow control: {flow_control}")
+
+        size = self.get_file_size(filename)
+        if size is None:
+            raise Exception(f"Unable to download {filename}: file not found")
+
+        if not isinstance(dst, (str, os.PathLike)):
+            return self.receive_file(filename, dst, size, timeout, flow_control, chunk_size)
+
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(dst)), prefix=f".{os.path.basename(dst)}.", suffix=".part")
+        try:
+            # mkstemp creates the file 0600: keep the mode of the file being
+            # replaced, or apply the umask to a new file
+            if os.path.exists(dst):
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(dst).st_mode))
+            else:
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(tmp_path, 0o666 & ~umask)
+            with os.fdopen(fd, "wb") as fp:
+                result = self.receive_file(filename, fp, size, timeout, flow_control, chunk_size)
+            os.replace(tmp_path, dst)
+            return result
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def receive_file(self, filename, dst, size, timeout, flow_control, chunk_size):
+        checksum = XorChecksum()
+        received = 0
+        rtscts = self.port.rtscts
+        start_time = time.time()
+        try:
+            self.port.rtscts = flow_control == "hardware"
+            self.write_serial_port_no_response(self.port, f"AT+QFDWL=\"{filename}\"")
+            resp = self.wait_for_raw_line(self.port, "CONNECT", timeout=10)
+            if not any(re.search("CONNECT", line) for line in resp):
+                raise Exception(f"Unable to download {filename}: {resp}")
+            while received < size:
+                chunk = self.read_serial_port_raw(
+                    self.port, min(chunk_size, size - received), timeout=timeout)
+                if not chunk:
+                    raise Exception(
+                        f"Unable to download {filename}: timeout after {received}/{size} bytes")
+                dst.write(chunk)
+                checksum.update(chunk)
+                received += len(chunk)
+        except Exception:
+            # Leave a clean port for the next command
+            self.discard_serial_input(self.port, timeout=timeout)
+            raise
+        finally:
+            self.port.rtscts = rtscts
+
+        resp = self.wait_for_response(self.port, r"\+QFDWL: \d+,[0-9a-fA-F]+", timeout=timeout)
+        return self.check_transfer(resp, "QFDWL", filename, size, checksum.digest(), start_time)
+
+    def check_transfer(self, resp, cmd, filename, size, checksum, start_time):
+        duration = time.time() - start_time
+        regex = rf"\+{cmd}: (\d+),([0-9a-fA-F]+)"
+        for line in resp:
+            if re.search(regex, line):
+                modem_size, modem_checksum = re.search(regex, line).groups()
+                if int(modem_size) != size or int(modem_checksum, 16) != checksum:
+                    raise Exception(
+                        f"{cmd} {filename}: transfer mismatch - size {modem_size}/{size},"
+                        f" checksum {modem_checksum}/{checksum:x}")
+                throughput = size / duration if duration else 0
+                logger.info(
+                    f"{cmd} {filename}: {size} bytes in {duration:.2f}s ({throughput / 1024:.1f} kB/s)")
+                return {"size": size, "checksum": checksum, "duration": duration, "throughput": throughput}
+            elif re.search("ERROR", line):
+                raise Exception(f"{cmd} {filename}: {line}")
+        raise Exception(f"{cmd} {filename}: transfer result not received")
+
 
 at = AT()
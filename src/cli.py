@@ -0,0 +1,256 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+
+from pathlib import Path
+
+logger = logging.getLogger("pyatcmd.cli")
+
+# Serial related modules (pyserial, AT/SerialManager) are only imported once a
+# command actually needs a port so that `--help` and argument errors stay fast.
+
+PORT_CACHE_FILE = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"),
+                       "pyatcmd", "ports.json")
+
+DEFAULT_READ_TIMEOUT = 0.2
+
+QUERIES = ("imsi", "iccid", "ip", "attach")
+
+FINAL_RESULT_REGEX = "^OK$|ERROR"
+
+
+class CommandError(Exception):
+    # Keeps the module response received before the failure so it is printed
+
+    def __init__(self, msg, output):
+        Exception.__init__(self, msg)
+        self.output = output
+
+
+class PortOpenError(Exception):
+    # Port could not be opened or is not an AT port: nothing has been sent
+    pass
+
+
+def load_cached_ports():
+    try:
+        with open(PORT_CACHE_FILE) as fp:
+            ports = json.load(fp)
+    except (OSError, ValueError):
+        return []
+    if not isinstance(ports, list):
+        return []
+    return [p for p in ports if isinstance(p, str)]
+
+
+def save_cached_ports(ports):
+    try:
+        PORT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(PORT_CACHE_FILE, "w") as fp:
+            json.dump(ports, fp)
+    except OSError as e:
+        logger.debug(f"Unable to write port cache {PORT_CACHE_FILE}: {e}")
+
+
+def discover_ports():
+    from .serial_manager import SerialManager
+
+    ports = SerialManager().get_at_port_names()
+    logger.debug(f"Discovered AT ports: {ports}")
+    if ports:
+        save_cached_ports(ports)
+    return ports
+
+
+def resolve_ports(args, rescan=False):
+    if args.port:
+        return list(args.port)
+
+    ports = [] if rescan or args.rescan else check_cached_ports(load_cached_ports())
+    if not ports:
+        ports = discover_ports()
+    return ports if args.all_devices else ports[:1]
+
+
+def check_cached_ports(ports):
+    # Drop cached device nodes which disappeared since the last discovery. A
+    # node which now belongs to another interface is detected by run_on_port.
+    return [p for p in ports if not p.startswith("/dev/") or os.path.exists(p)]
+
+
+def read_script(path):
+    cmds = []
+    with open(path) as fp:
+        for line in fp:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                cmds.append(line)
+    return cmds
+
+
+def run_query(at, query):
+    if query == "imsi":
+        return at.get_imsi()
+    elif query == "iccid":
+        return at.get_iccid()
+    elif query == "ip":
+        return at.get_ip_address()
+    elif query == "attach":
+        c, cg, ce = at.is_attached(details=True)
+        return f"CREG:{int(c)} CGREG:{int(cg)} CEREG:{int(ce)}"
+
+
+def has_final_result(resp):
+    return any(re.search(FINAL_RESULT_REGEX, line) for line in resp)
+
+
+def run_commands(at, cmds, timeout, keep_going=False):
+    output = []
+    for cmd in cmds:
+        resp = at.send_cmd(cmd, timeout=timeout)
+        output += [line for line in resp if line != "" and line != cmd]
+        if not has_final_result(resp):
+            raise CommandError(f"'{cmd}': no response", output)
+        if not at.check_resp(resp) and not keep_going:
+            raise CommandError(f"'{cmd}' failed", output)
+    return output
+
+
+def run_on_port(port_name, args, cmds):
+    from .at_manager import AT
+
+    at = AT(port_name)
+    at.read_until = FINAL_RESULT_REGEX
+    try:
+        at.open_port(timeout=args.read_timeout)
+    except Exception as e:
+        raise PortOpenError(f"Unable to open {port_name}: {e}")
+    try:
+        # tty numbers may have shifted: make sure this is still an AT port
+        if "OK" not in at.write_serial_port(at.port, "AT", print_output=False):
+            raise PortOpenError(f"{port_name} is not an AT port")
+        if args.query:
+            result = run_query(at, args.query)
+            if not result:
+                raise Exception(f"{args.query} query failed")
+            return [result]
+        return run_commands(at, cmds, args.timeout, args.keep_going)
+    finally:
+        at.close_port()
+
+
+def run(ports, args, cmds):
+    def safe_run(port_name):
+        try:
+            return run_on_port(port_name, args, cmds)
+        except Exception as e:
+            return e
+
+    if len(ports) == 1:
+        return {ports[0]: safe_run(ports[0])}
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+        return dict(zip(ports, executor.map(safe_run, ports)))
+
+
+def print_results(results):
+    failed = False
+    prefix = len(results) > 1
+    for port_name, output in results.items():
+        if isinstance(output, Exception):
+            failed = True
+            for line in getattr(output, "output", []):
+                print(f"{port_name}: {line}" if prefix else line)
+            print(f"{port_name}: {output}", file=sys.stderr)
+            continue
+        for line in output:
+            print(f"{port_name}: {line}" if prefix else line)
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pyatcmd", description="Send AT commands using serial port")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("cmd", nargs="?", help="AT command to send")
+    action.add_argument("-q", "--query", choices=QUERIES,
+                        help="run a predefined query")
+    action.add_argument("-s", "--script", type=Path,
+                        help="file with one AT command per line ('#' for comments)")
+    action.add_argument("-l", "--list-ports", action="store_true",
+                        help="discover AT ports and refresh the port cache")
+    parser.add_argument("-p", "--port", action="append",
+                        help="AT port to use (can be repeated), skips discovery")
+    parser.add_argument("-a", "--all-devices", action="store_true",
+                        help="run on every connected device in parallel")
+    parser.add_argument("--rescan", action="store_true",
+                        help="ignore cached ports and discover them again")
+    parser.add_argument("-t", "--timeout", type=float, default=60,
+                        help="response timeout per command in seconds (default: 60)")
+    parser.add_argument("--read-timeout", type=float, default=DEFAULT_READ_TIMEOUT,
+                        help=f"serial read timeout in seconds (default: {DEFAULT_READ_TIMEOUT})")
+    parser.add_argument("-k", "--keep-going", action="store_true",
+                        help="do not stop a script on the first ERROR")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="log serial traffic on stderr")
+    parser.add_argument("--log-dir", type=Path,
+                        help="also write a log file in this directory")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.log_dir:
+        from .logger_factory import pyatcmd_logger
+
+        pyatcmd_logger.create_logger(path=args.log_dir)
+        pyatcmd_logger.set_ch_level(
+            logging.DEBUG if args.verbose else logging.WARNING)
+    elif args.verbose:
+        logging.basicConfig(
+            format='{asctime} {levelname:.1}/ {name:>30} - {message}', style='{',
+            datefmt='%Y-%m-%d %H:%M:%S', level=logging.DEBUG)
+
+    if args.list_ports:
+        ports = args.port or discover_ports()
+        for port_name in ports:
+            print(port_name)
+        return 0 if ports else 1
+
+    if args.script:
+        cmds = read_script(args.script)
+    elif args.cmd:
+        if not re.match("^AT", args.cmd, re.IGNORECASE):
+            print(f"Not an AT command: {args.cmd}", file=sys.stderr)
+            return 2
+        cmds = [args.cmd]
+    else:
+        cmds = []
+
+    ports = resolve_ports(args)
+    if not ports:
+        print("No AT port found", file=sys.stderr)
+        return 1
+
+    results = run(ports, args, cmds)
+    failed = [p for p, r in results.items() if isinstance(r, PortOpenError)]
+    if failed and not args.port and not args.rescan:
+        # Cached port may be stale (device re-enumerated): rediscover once and
+        # only run on ports where nothing has been sent yet
+        logger.debug(f"Unable to use cached ports {failed}, rediscovering AT ports")
+        ports = [p for p in resolve_ports(args, rescan=True) if p not in results or p in failed]
+        if ports:
+            for port_name in failed:
+                del results[port_name]
+            results.update(run(ports, args, cmds))
+    return print_results(results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import os
+import re
+import time
+import random
+import logging
+
+from .at_manager import AT
+from .utils import wait_for
+
+logger = logging.getLogger("pyatcmd.connection_manager")
+
+# Commands configuring the session which are lost when the module reboots or
+# re-enumerates. The last value sent for each of them is replayed on reconnect.
+# Chained commands (";") are never recorded.
+SESSION_CMD_REGEX = r"^AT(E[01]?|\+(CMEE|CSCS|CNMI|CMGF|CREG|CGREG|CEREG)=(?!\?)[^;]*|\+COPS=3,[^;]*)$"
+
+# Commands which only read the module state and can safely be sent again.
+# Chained commands (";") are never retried.
+IDEMPOTENT_CMD_REGEX = r"^AT(I\d*|\+(CIMI|CCID|QCCID|CGSN|GSN|CGMI|CGMM|CGMR|CSQ|CNUM|CGCONTRDP)|\+[^;=]*=?\?)?$"
+
+
+class ConnectionManager(AT):
+
+    def __init__(self, port_name=None, read_timeout=1, reconnect_timeout=60,
+                 backoff_base=0.1, backoff_max=5, max_retries=2):
+        AT.__init__(self, port_name)
+        self.port = None
+        self.device_key = None
+        self.read_timeout = read_timeout
+        self.reconnect_timeout = reconnect_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retries = max_retries
+        self.session_cmds = {}
+        # Fail fast on read errors, reconnection is handled here
+        self.read_error_delay = 0.05
+        self.max_read_errors = 2
+
+    def open_port(self, timeout=None):
+        AT.open_port(self, self.read_timeout if timeout is None else timeout)
+        self.device_key = self.get_port_device_key(self.port_name)
+
+    def close_port(self):
+        if self.port is not None:
+            AT.close_port(self)
+
+    def resolve_port_name(self):
+        if self.port_name is not None and self.is_port_present(self.port_name) \
+                and self.is_at_port(self.port_name, timeout=self.read_timeout):
+            return self.port_name
+        # tty number may have changed after the module re-enumerated. Never
+        # switch to another module: while this one is re-enumerating, keep
+        # looking for its own ports only.
+        if self.device_key is not None:
+            port_name = self.get_at_port_name(
+                device_key=self.device_key, timeout=self.read_timeout)
+        else:
+            port_name = self.get_at_port_name(timeout=self.read_timeout)
+        if port_name is None:
+            raise Exception(f"No AT port found for device {self.device_key}")
+        if port_name != self.port_name:
+            logger.info(f"AT port moved from {self.port_name} to {port_name}")
+        return port_name
+
+    def is_port_present(self, port_name):
+        return not port_name.startswith("/dev/") or os.path.exists(port_name)
+
+    def get_backoff_delay(self, attempt):
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def reconnect(self):
+        logger.warning(f"Connection lost on {self.port_name}, reconnecting")
+        start_time = time.time()
+        attempt = 0
+        while True:
+            try:
+                self.close_port()
+            except Exception as e:
+                logger.debug(f"reconnect: Failure while trying to close port: {e}")
+            if attempt:
+                wait_for(self.get_backoff_delay(attempt))
+            try:
+                self.port_name = self.resolve_port_name()
+                self.readError = 0
+                self.open_port()
+                self.replay_session()
+                logger.info(
+                    f"Reconnected to {self.port_name} after {time.time() - start_time:.2f}s")
+                return
+            except Exception as e:
+                logger.debug(f"reconnect#{attempt}: {e}")
+            attempt += 1
+            if time.time() - start_time > self.reconnect_timeout:
+                raise Exception(
+                    f"Unable to reconnect to the module after {self.reconnect_timeout}s")
+
+    def replay_session(self):
+        for cmd in self.session_cmds.values():
+            resp = AT.send_cmd(self, cmd, timeout=5)
+            if not self.check_resp(resp):
+                raise Exception(f"Unable to restore session setting ({cmd})")
+
+    def record_session_cmd(self, cmd):
+        if ";" not in cmd and re.search(SESSION_CMD_REGEX, cmd):
+            if cmd.startswith("AT+COPS"):
+                key = "AT+COPS=3"
+            else:
+                key = re.search(r"^(ATE|AT\+\w+)", cmd).group(1)
+            self.session_cmds[key] = cmd
+
+    def is_idempotent(self, cmd):
+        return ";" not in cmd and re.search(IDEMPOTENT_CMD_REGEX, cmd) is not None
+
+    def send_cmd(self, cmd, timeout=60, wait_resp="(OK|ERROR)", eol=True):
+        retries = 0
+        while True:
+            sent = False
+            try:
+                if self.port is None:
+                    self.open_port()
+                elif not self.port.isOpen():
+                    self.reconnect()
+                sent = True
+                resp = AT.send_cmd(self, cmd, timeout=timeout, wait_resp=wait_resp, eol=eol)
+                # check_resp accepts empty (timed out) responses, require OK
+                if eol and "OK" in resp:
+                    self.record_session_cmd(cmd)
+                return resp
+            except OSError as e:
+                # serial.SerialException is an OSError
+                logger.error(f"{self.port_name} - '{cmd}' failed: {e}")
+                self.reconnect()
+                if not sent:
+                    # Failed before writing: the command never reached the module
+                    continue
+                if not eol or not self.is_idempotent(cmd) or retries >= self.max_retries:
+                    raise
+                retries += 1
+                logger.info(f"Retrying '{cmd}' ({retries}/{self.max_retries})")
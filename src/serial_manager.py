@@ -14,6 +14,11 @@ class SerialManager:
 
     def __init__(self):
         self.readError = 0
+        self.read_error_delay = 1
+        self.max_read_errors = 10
+        # Optional regex: stop reading as soon as a matching line is received
+        # instead of waiting for the whole port timeout
+        self.read_until = None
         self.rLock = threading.Lock()
         pass
 
@@ -50,10 +55,10 @@ class SerialManager:
                     response = None
                     self.readError += 1
                     logger.error(f"ERROR reading PORT{port.name}")
-                    time.sleep(1)
-                    if self.readError > 10:
+                    time.sleep(self.read_error_delay)
+                    if self.readError > self.max_read_errors:
                         logger.error(traceback.format_exc())
-                        raise Exception(
+                        raise serial.SerialException(
                             f"{port.name} seems stuck - Please check manually and reboot if necessary")
                 if isinstance(response, str):
                     clean_response.append(re.sub("\\r|\\n", "", response))
@@ -61,6 +66,8 @@ class SerialManager:
                         resp = str(re.sub("\\r|\\n", "", response))
                         if resp != "":
                             logger.info(f"{port.name} - {resp}")
+                    if self.read_until and re.search(self.read_until, clean_response[-1]):
+                        break
         return clean_response
 
     def wait_for_response(self, port, response, timeout=180, silent=False):
@@ -136,6 +143,71 @@ class SerialManager:
         finally:
             self.rLock.release()
 
+    def write_serial_port_raw(self, port, data):
+        if not port:
+            raise Exception("COM Port is not available")
+
+        self.rLock.acquire()
+        try:
+            port.write(data)
+        except serial.SerialException:
+            logger.error(
+                "SerialException : Unable to write on port - Device could be already disconnected")
+            raise
+        finally:
+            self.rLock.release()
+
+    def read_serial_port_raw(self, port, size, timeout=10):
+        # Read up to size bytes without decoding, stops early on timeout
+        data = bytearray()
+        start_time = time.time()
+        self.rLock.acquire()
+        try:
+            while len(data) < size and (time.time() - start_time) < timeout:
+                data += port.read(size - len(data))
+        finally:
+            self.rLock.release()
+        return bytes(data)
+
+    def discard_serial_input(self, port, timeout=10):
+        # Drop whatever the module is still sending until the port is quiet
+        discarded = 0
+        start_time = time.time()
+        self.rLock.acquire()
+        try:
+            while (time.time() - start_time) < timeout:
+                data = port.read(4096)
+                if not data:
+                    break
+                discarded += len(data)
+        finally:
+            self.rLock.release()
+        if discarded:
+            logger.debug(f"{port.name} - {discarded} bytes discarded")
+        return discarded
+
+    def wait_for_raw_line(self, port, response, timeout=10):
+        # Same as wait_for_response but reads bytes lines so that no binary
+        # data following the expected line is consumed or decoded
+        start_time = time.time()
+        full_resp = []
+        while (time.time() - start_time) < timeout:
+            self.rLock.acquire()
+            try:
+                line = port.readline()
+            finally:
+                self.rLock.release()
+            line = re.sub("\\r|\\n", "", line.decode(errors="replace"))
+            if line == "":
+                continue
+            logger.info(f"{port.name} - {line}")
+            full_resp.append(line)
+            if re.search(response, line) or re.search("ERROR", line):
+                return full_resp
+        logger.error(
+            f"{port.name} - TIMEOUT IN WAIT_FOR_RAW_LINE - {response} not received in {timeout}s")
+        return full_resp
+
     def get_com_port_list(self):
         return list(serial.tools.list_ports.comports(True)) if re.search("linux", sys.platform) else list(serial.tools.list_ports.comports())
 
@@ -150,19 +222,52 @@ class SerialManager:
                 pass
         return com_port_list
 
-    def get_at_port_name(self):
+    def is_at_port(self, device, timeout=1):
+        at_port = None
+        try:
+            at_port = self.open_serial_port(
+                device, timeout=timeout, write_timeout=1)
+            return "OK" in self.write_serial_port(at_port, "ATE1\r", print_output=False)
+        except Exception:
+            return False
+        finally:
+            if at_port:
+                self.close_serial_port(at_port)
+
+    def get_at_port_name(self, device_key=None, timeout=1):
         for p in sorted(self.get_com_port_list()):
             if re.search(r"/dev/ttyUSB*|COM*", p.device):
-                try:
-                    at_port = None
-                    at_port = self.open_serial_port(p.device, write_timeout=1)
-                    if "OK" in self.write_serial_port(at_port, "ATE1\r", print_output=False):
-                        return p.device
-                except Exception:
-                    pass
-                finally:
-                    if at_port:
-                        self.close_serial_port(at_port)
+                if device_key is not None and get_device_key(p) != device_key:
+                    continue
+                if self.is_at_port(p.device, timeout):
+                    return p.device
+
+    def get_at_port_names(self, timeout=1):
+        # Return the first AT port of every connected device. Ports are probed
+        # in parallel and grouped by USB serial number (or USB location) so a
+        # modem exposing several AT interfaces is only listed once.
+        candidates = [p for p in sorted(self.get_com_port_list())
+                      if re.search(r"/dev/ttyUSB*|COM*", p.device)]
+        if not candidates:
+            return []
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+            results = list(executor.map(
+                lambda p: SerialManager().is_at_port(p.device, timeout), candidates))
+
+        at_ports = {}
+        for p, is_at in zip(candidates, results):
+            if is_at:
+                at_ports.setdefault(get_device_key(p), p.device)
+        return list(at_ports.values())
+
+    def get_port_device_key(self, port_name):
+        for p in self.get_com_port_list():
+            if p.device == port_name:
+                return get_device_key(p)
+        return None
 
     def get_dm_port_name(self):
         for p in self.get_com_port_list():
@@ -171,4 +276,13 @@ class SerialManager:
         return ""
 
 
+def get_device_key(port_info):
+    # Identify the USB device behind a port, independently of its tty number
+    if port_info.serial_number:
+        return port_info.serial_number
+    elif port_info.location:
+        return port_info.location.split(":")[0]
+    return port_info.device
+
+
 serial_manager = SerialManager()
@@ -16,3 +16,40 @@ def led(led, state):
             fp.write("255")
         else:
             fp.write("0")
+
+
+class XorChecksum:
+    # Quectel file checksum: XOR of every 2 bytes (big endian), an odd trailing
+    # byte is padded with 0. Data can be fed in chunks of any size.
+
+    def __init__(self):
+        self.value = 0
+        self.pending = None
+
+    def update(self, data):
+        data = memoryview(data).cast("B")
+        if not len(data):
+            return
+        if self.pending is not None:
+            self.value ^= (self.pending << 8) | data[0]
+            self.pending = None
+            data = data[1:]
+        if len(data) % 2:
+            self.pending = data[-1]
+            data = data[:-1]
+
+        # Fold the chunk as a big integer: XOR high and low halves until a
+        # single 16-bit word is left (leading zero padding is neutral)
+        word = int.from_bytes(data, "big")
+        width = 16
+        while width < len(data) * 8:
+            width *= 2
+        while width > 16:
+            width //= 2
+            word = (word >> width) ^ (word & ((1 << width) - 1))
+        self.value ^= word
+
+    def digest(self):
+        if self.pending is not None:
+            return self.value ^ (self.pending << 8)
+        return self.value
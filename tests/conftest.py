@@ -0,0 +1,29 @@
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests run without hardware: provide a minimal `serial` module when pyserial
+# is not installed. Serial ports are never opened by the tests.
+try:
+    import serial  # noqa: F401
+except ImportError:
+    serial = types.ModuleType("serial")
+
+    class SerialException(IOError):
+        pass
+
+    class Serial:
+        def __init__(self, port, **kwargs):
+            raise SerialException(f"could not open port {port}")
+
+    serial.SerialException = SerialException
+    serial.SerialTimeoutException = SerialException
+    serial.Serial = Serial
+    serial.tools = types.ModuleType("serial.tools")
+    serial.tools.list_ports = types.ModuleType("serial.tools.list_ports")
+    serial.tools.list_ports.comports = lambda *args: []
+    sys.modules["serial"] = serial
+    sys.modules["serial.tools"] = serial.tools
+    sys.modules["serial.tools.list_ports"] = serial.tools.list_ports
@@ -0,0 +1,108 @@
+import pytest
+
+from src import cli
+from src.at_manager import AT
+
+
+def fake_at(responses):
+    at = AT()
+    sent = []
+
+    def send_cmd(cmd, timeout=60):
+        sent.append(cmd)
+        return responses[cmd]
+
+    at.send_cmd = send_cmd
+    at.sent = sent
+    return at
+
+
+def test_read_script(tmp_path):
+    script = tmp_path / "setup.txt"
+    script.write_text("# configure SMS\nAT+CMGF=1\n\n   \n  AT+CNMI=1,2,2,0,0  \n#AT+CFUN=1,1\n")
+    assert cli.read_script(script) == ["AT+CMGF=1", "AT+CNMI=1,2,2,0,0"]
+
+
+@pytest.mark.parametrize("resp,expected", [
+    (["AT", "OK"], True), (["+CME ERROR: 10"], True), (["ERROR"], True),
+    ([], False), (["AT+CSQ", "+CSQ: 20,99", ""], False), (["+COPS: 0,0,\"OK Mobile\""], False),
+])
+def test_has_final_result(resp, expected):
+    assert cli.has_final_result(resp) == expected
+
+
+def test_run_commands():
+    at = fake_at({"AT+CSQ": ["AT+CSQ", "+CSQ: 20,99", "", "OK"], "AT+CIMI": ["AT+CIMI", "123456789012345", "OK"]})
+    assert cli.run_commands(at, ["AT+CSQ", "AT+CIMI"], 1) == ["+CSQ: 20,99", "OK", "123456789012345", "OK"]
+
+
+def test_run_commands_stops_on_error():
+    at = fake_at({"AT+CSQ": ["AT+CSQ", "+CME ERROR: 10"], "AT+CIMI": ["OK"]})
+    with pytest.raises(cli.CommandError) as e:
+        cli.run_commands(at, ["AT+CSQ", "AT+CIMI"], 1)
+    assert e.value.output == ["+CME ERROR: 10"]
+    assert at.sent == ["AT+CSQ"]
+
+
+def test_run_commands_keep_going():
+    at = fake_at({"AT+CSQ": ["+CME ERROR: 10"], "AT+CIMI": ["123456789012345", "OK"]})
+    output = cli.run_commands(at, ["AT+CSQ", "AT+CIMI"], 1, keep_going=True)
+    assert output == ["+CME ERROR: 10", "123456789012345", "OK"]
+
+
+def test_run_commands_no_response():
+    at = fake_at({"AT+CSQ": ["AT+CSQ", ""]})
+    with pytest.raises(cli.CommandError, match="no response"):
+        cli.run_commands(at, ["AT+CSQ"], 1, keep_going=True)
+
+
+def test_print_results_success(capsys):
+    assert cli.print_results({"/dev/ttyUSB2": ["+CSQ: 20,99", "OK"]}) == 0
+    out, err = capsys.readouterr()
+    assert out == "+CSQ: 20,99\nOK\n"
+    assert err == ""
+
+
+def test_print_results_failure(capsys):
+    results = {
+        "/dev/ttyUSB2": ["OK"],
+        "/dev/ttyUSB6": cli.CommandError("'AT+CSQ' failed", ["+CME ERROR: 10"]),
+        "/dev/ttyUSB9": Exception("imsi query failed"),
+    }
+    assert cli.print_results(results) == 1
+    out, err = capsys.readouterr()
+    assert out == "/dev/ttyUSB2: OK\n/dev/ttyUSB6: +CME ERROR: 10\n"
+    assert err == "/dev/ttyUSB6: 'AT+CSQ' failed\n/dev/ttyUSB9: imsi query failed\n"
+
+
+@pytest.mark.parametrize("content", ["{not json", "{\"ports\": 1}", "[1, \"/dev/ttyUSB2\"]"])
+def test_load_cached_ports_corrupt_file(monkeypatch, tmp_path, content):
+    cache = tmp_path / "ports.json"
+    cache.write_text(content)
+    monkeypatch.setattr(cli, "PORT_CACHE_FILE", cache)
+    assert cli.load_cached_ports() == (["/dev/ttyUSB2"] if content.startswith("[") else [])
+
+
+def test_load_cached_ports_missing_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(cli, "PORT_CACHE_FILE", tmp_path / "missing" / "ports.json")
+    assert cli.load_cached_ports() == []
+
+
+def test_main_reruns_only_ports_which_failed_to_open(monkeypatch, capsys):
+    calls = []
+
+    def run_on_port(port_name, args, cmds):
+        calls.append(port_name)
+        if port_name == "COM3":
+            raise cli.PortOpenError("COM3 is not an AT port")
+        if port_name == "COM5":
+            raise cli.CommandError("'AT+CFUN=1,1' failed", [])
+        return ["OK"]
+
+    monkeypatch.setattr(cli, "run_on_port", run_on_port)
+    monkeypatch.setattr(cli, "load_cached_ports", lambda: ["COM3", "COM4", "COM5"])
+    monkeypatch.setattr(cli, "discover_ports", lambda: ["COM4", "COM5", "COM7"])
+    assert cli.main(["AT+CFUN=1,1", "--all-devices"]) == 1
+    assert sorted(calls) == ["COM3", "COM4", "COM5", "COM7"]
+    out, err = capsys.readouterr()
+    assert "COM3" not in out + err
@@ -0,0 +1,216 @@
+import re
+import types
+
+from collections import namedtuple
+
+import pytest
+import serial
+
+from src.connection_manager import ConnectionManager, SESSION_CMD_REGEX, IDEMPOTENT_CMD_REGEX
+
+
+# Sortable stand-in for serial.tools.list_ports_common.ListPortInfo
+PortInfo = namedtuple("PortInfo", ["device", "serial_number", "location", "description"])
+
+
+def port_info(device, serial_number=None, location=None):
+    return PortInfo(device, serial_number, location, "")
+
+
+@pytest.mark.parametrize("cmd", ["ATE0", "ATE1", "AT+CREG=2", "AT+CEREG=2", "AT+CNMI=1,2,2,0,0",
+                                 "AT+CMGF=1", "AT+COPS=3,2"])
+def test_session_cmd_regex_matches_settings(cmd):
+    assert re.search(SESSION_CMD_REGEX, cmd)
+
+
+@pytest.mark.parametrize("cmd", ["AT+CREG=?", "AT+CREG?", "AT+COPS=0", "AT+CFUN=1", "AT+CIMI"])
+def test_session_cmd_regex_ignores_other_cmds(cmd):
+    assert not re.search(SESSION_CMD_REGEX, cmd)
+
+
+@pytest.mark.parametrize("cmd,idempotent", [
+    ("AT", True), ("ATI", True), ("AT+CIMI", True), ("AT+CCID", True), ("AT+CREG?", True),
+    ("AT+QPING=?", True), ("AT+CFUN=1,1", False), ("AT+CMGS=\"123\"", False), ("AT+COPS=0", False),
+])
+def test_is_idempotent(cmd, idempotent):
+    assert ConnectionManager().is_idempotent(cmd) == idempotent
+    assert bool(re.search(IDEMPOTENT_CMD_REGEX, cmd)) == idempotent
+
+
+def test_record_session_cmd_keeps_last_setting():
+    cm = ConnectionManager()
+    for cmd in ["AT+CREG=2", "AT+CREG=?", "ATE1", "ATE0", "AT+COPS=3,2", "AT+COPS=0"]:
+        cm.record_session_cmd(cmd)
+    assert cm.session_cmds == {"AT+CREG": "AT+CREG=2", "ATE": "ATE0", "AT+COPS=3": "AT+COPS=3,2"}
+
+
+def test_send_cmd_records_setting_only_on_ok(monkeypatch):
+    cm = ConnectionManager()
+    cm.port = types.SimpleNamespace(isOpen=lambda: True)
+    responses = {"AT+CREG=2": ["AT+CREG=2", "OK"], "AT+CGREG=2": [], "AT+CEREG=2": ["ERROR"]}
+    monkeypatch.setattr("src.at_manager.AT.send_cmd", lambda self, cmd, **kwargs: responses[cmd])
+    for cmd in responses:
+        cm.send_cmd(cmd)
+    assert cm.session_cmds == {"AT+CREG": "AT+CREG=2"}
+
+
+def test_backoff_delay_is_bounded():
+    cm = ConnectionManager(backoff_base=0.1, backoff_max=2)
+    for attempt in range(20):
+        delay = cm.get_backoff_delay(attempt)
+        assert 0 <= delay <= min(2, 0.1 * 2 ** attempt)
+
+
+def test_resolve_port_name_follows_device(monkeypatch):
+    cm = ConnectionManager("/dev/ttyUSB2")
+    cm.device_key = "MODEM1"
+    ports = [port_info("/dev/ttyUSB0", "MODEM2"), port_info("/dev/ttyUSB6", "MODEM1")]
+    monkeypatch.setattr(cm, "get_com_port_list", lambda: ports)
+    monkeypatch.setattr(cm, "is_port_present", lambda port_name: False)
+    monkeypatch.setattr(cm, "is_at_port", lambda device, timeout=1: True)
+    assert cm.resolve_port_name() == "/dev/ttyUSB6"
+
+
+def test_resolve_port_name_never_switches_device(monkeypatch):
+    cm = ConnectionManager("/dev/ttyUSB2")
+    cm.device_key = "MODEM1"
+    monkeypatch.setattr(cm, "get_com_port_list", lambda: [port_info("/dev/ttyUSB0", "MODEM2")])
+    monkeypatch.setattr(cm, "is_port_present", lambda port_name: False)
+    monkeypatch.setattr(cm, "is_at_port", lambda device, timeout=1: True)
+    with pytest.raises(Exception, match="No AT port found"):
+        cm.resolve_port_name()
+
+
+def test_resolve_port_name_without_device_key(monkeypatch):
+    cm = ConnectionManager()
+    probed = []
+    monkeypatch.setattr(cm, "get_com_port_list", lambda: [port_info("/dev/ttyUSB3", location="1-1.2:1.3")])
+    monkeypatch.setattr(cm, "is_at_port", lambda device, timeout=1: probed.append(timeout) or True)
+    cm.read_timeout = 0.2
+    assert cm.resolve_port_name() == "/dev/ttyUSB3"
+    assert probed == [0.2]
+
+
+@pytest.mark.parametrize("cmd", ["AT+CREG=2;+CFUN=1,1", "AT+CMGF=1;+QFDEL=\"*\"", "ATE1;+CFUN=1,1",
+                                 "AT+COPS=3,2;+COPS=0"])
+def test_chained_cmds_are_not_session_settings(cmd):
+    cm = ConnectionManager()
+    cm.record_session_cmd(cmd)
+    assert not re.search(SESSION_CMD_REGEX, cmd)
+    assert cm.session_cmds == {}
+
+
+@pytest.mark.parametrize("cmd", ["AT+CFUN=1,1;+CREG?", "AT+QFDEL=\"*\";+CSQ?", "AT+CSQ;+CREG?",
+                                 "AT+CFUN=1,1?"])
+def test_chained_cmds_are_not_idempotent(cmd):
+    assert not ConnectionManager().is_idempotent(cmd)
+    assert not re.search(IDEMPOTENT_CMD_REGEX, cmd)
+
+
+class FakePort:
+    # Answers OK (or the configured response) to every command, or raises on
+    # write/readline to simulate a lost USB device
+
+    def __init__(self, responses=None, fail_write=False, fail_read=False):
+        self.name = "COM3"
+        self.timeout = 0.01
+        self.responses = responses or {}
+        self.fail_write = fail_write
+        self.fail_read = fail_read
+        self.is_open = True
+        self.written = []
+        self.lines = []
+
+    def isOpen(self):
+        return self.is_open
+
+    def close(self):
+        self.is_open = False
+
+    def write(self, data):
+        if self.fail_write:
+            raise serial.SerialException("write failed")
+        cmd = data.decode().strip()
+        self.written.append(cmd)
+        self.lines += [cmd] + self.responses.get(cmd, ["OK"])
+
+    def readline(self):
+        if self.fail_read:
+            raise serial.SerialException("read failed")
+        return f"{self.lines.pop(0)}\r\n".encode() if self.lines else b""
+
+
+def make_cm(monkeypatch, ports, **kwargs):
+    # ports: iterable of FakePort or exceptions raised when opening the port
+    cm = ConnectionManager("COM3", read_timeout=0.01, backoff_base=0, **kwargs)
+    cm.read_error_delay = 0
+    ports = iter(ports)
+    cm.opened = []
+
+    def open_serial_port(port_name, timeout=1, **kwargs):
+        port = next(ports)
+        if isinstance(port, Exception):
+            raise port
+        cm.opened.append(port)
+        return port
+
+    monkeypatch.setattr(cm, "open_serial_port", open_serial_port)
+    monkeypatch.setattr(cm, "get_port_device_key", lambda port_name: "MODEM1")
+    monkeypatch.setattr(cm, "resolve_port_name", lambda: "COM3")
+    return cm
+
+
+@pytest.mark.parametrize("failing_port", [FakePort(fail_write=True), FakePort(fail_read=True)])
+def test_send_cmd_reconnects_and_retries_read_only_cmd(monkeypatch, failing_port):
+    port = FakePort({"AT+CIMI": ["460001234567890", "OK"]})
+    cm = make_cm(monkeypatch, [failing_port, port])
+    assert cm.get_imsi() == "460001234567890"
+    assert port.written == ["AT+CIMI"]
+    assert not failing_port.is_open
+
+
+def test_send_cmd_retry_limit(monkeypatch):
+    ports = [FakePort(fail_write=True) for i in range(10)]
+    cm = make_cm(monkeypatch, ports, max_retries=2)
+    with pytest.raises(serial.SerialException):
+        cm.send_cmd("AT+CSQ")
+    # first attempt + 2 retries, then a last reconnect before giving up
+    assert len(cm.opened) == 4
+
+
+@pytest.mark.parametrize("cmd", ["AT+CFUN=1,1", "AT+CFUN=1,1;+CREG?"])
+def test_send_cmd_does_not_retry_unsafe_cmd(monkeypatch, cmd):
+    port = FakePort()
+    cm = make_cm(monkeypatch, [FakePort(fail_write=True), port])
+    with pytest.raises(serial.SerialException):
+        cm.send_cmd(cmd)
+    assert port.written == []
+
+
+def test_send_cmd_retries_cmd_never_sent(monkeypatch):
+    port = FakePort()
+    cm = make_cm(monkeypatch, [serial.SerialException("could not open port"), port])
+    assert "OK" in cm.send_cmd("AT+CFUN=1")
+    assert port.written == ["AT+CFUN=1"]
+
+
+def test_reconnect_replays_session_in_order(monkeypatch):
+    port = FakePort()
+    new_port = FakePort()
+    cm = make_cm(monkeypatch, [port, new_port])
+    for cmd in ["ATE1", "AT+CREG=2", "AT+CMGF=1", "AT+CREG=?", "AT+CREG=0"]:
+        cm.send_cmd(cmd)
+    port.fail_write = True
+    cm.send_cmd("AT+CSQ")
+    assert new_port.written == ["ATE1", "AT+CREG=0", "AT+CMGF=1", "AT+CSQ"]
+
+
+def test_reconnect_fails_when_session_cannot_be_restored(monkeypatch):
+    port = FakePort()
+    ports = [port] + [FakePort({"AT+CREG=2": ["ERROR"]}) for i in range(1000)]
+    cm = make_cm(monkeypatch, ports, reconnect_timeout=0.05)
+    cm.send_cmd("AT+CREG=2")
+    port.fail_write = True
+    with pytest.raises(Exception, match="Unable to reconnect"):
+        cm.send_cmd("AT+CSQ")
+    assert all(p.written == ["AT+CREG=2"] for p in cm.opened[1:])
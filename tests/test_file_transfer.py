@@ -0,0 +1,249 @@
+import io
+import os
+import stat
+import time
+
+import pytest
+import serial
+
+from src.at_manager import AT
+from src.utils import XorChecksum
+
+
+def reference_checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    checksum = 0
+    for i in range(0, len(data), 2):
+        checksum ^= int.from_bytes(data[i:i + 2], "big")
+    return checksum
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 1023, 1024, 4097])
+def test_xor_checksum(size):
+    data = os.urandom(size)
+    checksum = XorChecksum()
+    checksum.update(data)
+    assert checksum.digest() == reference_checksum(data)
+
+
+def test_xor_checksum_odd_chunks():
+    data = os.urandom(5001)
+    checksum = XorChecksum()
+    for i in range(0, len(data), 7):
+        checksum.update(data[i:i + 7])
+    assert checksum.digest() == reference_checksum(data)
+
+
+def test_check_transfer():
+    result = AT().check_transfer(["", "+QFUPL: 5001,42c9", "", "OK"],
+                                 "QFUPL", "UFS:a.bin", 5001, 0x42c9, time.time())
+    assert result["size"] == 5001
+    assert result["checksum"] == 0x42c9
+
+
+@pytest.mark.parametrize("resp", [["+QFDWL: 5000,42c9"], ["+QFDWL: 5001,42c8"], ["OK"], []])
+def test_check_transfer_mismatch(resp):
+    with pytest.raises(Exception):
+        AT().check_transfer(resp, "QFDWL", "UFS:a.bin", 5001, 0x42c9, time.time())
+
+
+def test_upload_invalid_flow_control():
+    with pytest.raises(ValueError):
+        AT().upload_file(io.BytesIO(b"data"), "UFS:a.bin", flow_control="xonxoff")
+
+
+@pytest.mark.parametrize("flow_control", ["software", "rtscts"])
+def test_download_invalid_flow_control(flow_control, tmp_path):
+    with pytest.raises(ValueError):
+        AT().download_file("UFS:a.bin", tmp_path / "a.bin", flow_control=flow_control)
+
+
+def test_download_missing_file_keeps_local_file(monkeypatch, tmp_path):
+    dst = tmp_path / "a.bin"
+    dst.write_bytes(b"previous")
+    at = AT()
+    monkeypatch.setattr(at, "get_file_size", lambda filename: None)
+    with pytest.raises(Exception, match="file not found"):
+        at.download_file("UFS:a.bin", dst)
+    assert dst.read_bytes() == b"previous"
+
+
+def test_download_failure_keeps_local_file(monkeypatch, tmp_path):
+    dst = tmp_path / "a.bin"
+    dst.write_bytes(b"previous")
+    at = AT()
+
+    def receive_file(filename, fp, *args):
+        fp.write(b"partial")
+        raise Exception("timeout")
+
+    monkeypatch.setattr(at, "get_file_size", lambda filename: 10)
+    monkeypatch.setattr(at, "receive_file", receive_file)
+    with pytest.raises(Exception, match="timeout"):
+        at.download_file("UFS:a.bin", dst)
+    assert dst.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["a.bin"]
+
+
+class FakeModemPort:
+    # Minimal Quectel file storage: QFLST, QFUPL (with ack mode) and QFDWL
+
+    def __init__(self, files=None, ack=True):
+        self.name = "COM3"
+        self.timeout = 0.01
+        self.rtscts = False
+        self.rtscts_on_write = []
+        self.files = files or {}
+        self.ack = ack
+        self.buf = bytearray()
+        self.upload = None
+        self.acks_read = 0
+
+    def write(self, data):
+        self.rtscts_on_write.append(self.rtscts)
+        if self.upload is not None:
+            name, size, ack_mode, received = self.upload
+            received += bytes(data)
+            self.upload[3] = received
+            if ack_mode and self.ack and len(received) % 1024 == 0 and len(received) < size:
+                self.buf += b"A"
+            if len(received) >= size:
+                self.files[name] = bytes(received)
+                self.upload = None
+                self.buf += f"\r\n+QFUPL: {size},{reference_checksum(received):x}\r\n\r\nOK\r\n".encode()
+            return
+        cmd = data.decode().strip()
+        self.buf += f"{cmd}\r\n".encode()
+        if cmd.startswith("AT+QFUPL="):
+            name, size, timeout, ack_mode = cmd[len("AT+QFUPL="):].split(",")
+            self.upload = [name.strip('"'), int(size), ack_mode == "1", b""]
+            self.buf += b"CONNECT\r\n"
+        elif cmd.startswith("AT+QFLST="):
+            name = cmd[len("AT+QFLST="):].strip('"')
+            if name in self.files:
+                self.buf += f"+QFLST: \"{name}\",{len(self.files[name])}\r\nOK\r\n".encode()
+            else:
+                self.buf += b"+CME ERROR: 405\r\n"
+        elif cmd.startswith("AT+QFDWL="):
+            data = self.files[cmd[len("AT+QFDWL="):].strip('"')]
+            self.buf += b"\r\nCONNECT\r\n" + data
+            self.buf += f"\r\n+QFDWL: {len(data)},{reference_checksum(data):x}\r\n\r\nOK\r\n".encode()
+        else:
+            self.buf += b"OK\r\n"
+
+    def readline(self):
+        end = self.buf.find(b"\n") + 1 or len(self.buf)
+        line = bytes(self.buf[:end])
+        del self.buf[:end]
+        return line
+
+    def read(self, size):
+        data = bytes(self.buf[:size])
+        del self.buf[:size]
+        if data == b"A":
+            self.acks_read += 1
+        return data
+
+
+def make_at(port):
+    at = AT("COM3")
+    at.port = port
+    return at
+
+
+def test_upload_ack_mode_waits_for_each_ack():
+    port = FakeModemPort()
+    data = os.urandom(5000)
+    result = make_at(port).upload_file(io.BytesIO(data), "UFS:a.bin", flow_control="software")
+    assert port.files["UFS:a.bin"] == data
+    assert result["size"] == 5000
+    assert port.acks_read == 4
+    assert port.buf == b""
+
+
+def test_upload_ack_mode_fails_without_ack():
+    port = FakeModemPort(ack=False)
+    with pytest.raises(Exception, match="no ack after 1024 bytes"):
+        make_at(port).upload_file(io.BytesIO(os.urandom(5000)), "UFS:a.bin", timeout=0.1,
+                                  flow_control="software")
+
+
+def test_upload_from_path(tmp_path):
+    src = tmp_path / "a.bin"
+    src.write_bytes(os.urandom(3001))
+    port = FakeModemPort()
+    make_at(port).upload_file(src, "UFS:a.bin", chunk_size=1000)
+    assert port.files["UFS:a.bin"] == src.read_bytes()
+
+
+def test_upload_restores_rtscts_after_error():
+    port = FakeModemPort()
+    at = make_at(port)
+    at.send_cmd = lambda *args, **kwargs: ["CONNECT"]
+
+    def write(data):
+        port.rtscts_on_write.append(port.rtscts)
+        raise serial.SerialException("write failed")
+
+    port.write = write
+    with pytest.raises(serial.SerialException):
+        at.upload_file(io.BytesIO(b"data"), "UFS:a.bin", flow_control="hardware")
+    assert port.rtscts_on_write == [True]
+    assert port.rtscts is False
+
+
+def test_download_restores_rtscts_after_error(tmp_path):
+    port = FakeModemPort({"UFS:a.bin": b"data"})
+    at = make_at(port)
+    at.wait_for_raw_line = lambda *args, **kwargs: ["+CME ERROR: 409"]
+    with pytest.raises(Exception, match="409"):
+        at.download_file("UFS:a.bin", io.BytesIO(), flow_control="hardware")
+    assert port.rtscts_on_write == [False, True]
+    assert port.rtscts is False
+
+
+@pytest.mark.parametrize("to_path", [False, True])
+def test_download_binary_payload(tmp_path, to_path):
+    data = b"\r\nOK\r\n\xff\xfe\x80ERROR\r\n+QFDWL: 1,0\r\n" + os.urandom(3000) + b"\r\nOK\r\n"
+    port = FakeModemPort({"UFS:a.bin": data})
+    dst = tmp_path / "a.bin" if to_path else io.BytesIO()
+    result = make_at(port).download_file("UFS:a.bin", dst, chunk_size=1000)
+    assert (dst.read_bytes() if to_path else dst.getvalue()) == data
+    assert result["checksum"] == reference_checksum(data)
+    assert port.buf == b""
+
+
+def test_download_failure_discards_remaining_data():
+    class FailingFile(io.BytesIO):
+        def write(self, data):
+            raise OSError("No space left on device")
+
+    port = FakeModemPort({"UFS:a.bin": os.urandom(10000)})
+    with pytest.raises(OSError):
+        make_at(port).download_file("UFS:a.bin", FailingFile(), chunk_size=1000)
+    assert port.buf == b""
+
+
+def test_check_transfer_reports_module_error():
+    with pytest.raises(Exception, match=r"\+CME ERROR: 409"):
+        AT().check_transfer(["", "+CME ERROR: 409"], "QFUPL", "UFS:a.bin", 10, 0, time.time())
+
+
+def test_download_keeps_mode_of_replaced_file(tmp_path):
+    dst = tmp_path / "a.bin"
+    dst.write_bytes(b"previous")
+    dst.chmod(0o644)
+    make_at(FakeModemPort({"UFS:a.bin": b"data"})).download_file("UFS:a.bin", dst)
+    assert dst.read_bytes() == b"data"
+    assert stat.S_IMODE(dst.stat().st_mode) == 0o644
+
+
+def test_download_applies_umask_to_new_file(tmp_path):
+    dst = tmp_path / "a.bin"
+    umask = os.umask(0o027)
+    try:
+        make_at(FakeModemPort({"UFS:a.bin": b"data"})).download_file("UFS:a.bin", dst)
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(dst.stat().st_mode) == 0o640